@@ -1,9 +1,18 @@
+import orjson
 from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 @app.post("/eval")
 async def evaluate(request: Request):
-    data = await request.json()
-    print("Evaluation request received:", data)
-    return {"status": "success", "message": "Evaluation received"}
\ No newline at end of file
+    data = orjson.loads(await request.body())
+    # A list body is a batch of evaluations handled in one round-trip
+    items = data if isinstance(data, list) else [data]
+    results = []
+    for item in items:
+        print("Evaluation request received:", item)
+        results.append({"status": "success", "message": "Evaluation received"})
+    if isinstance(data, list):
+        return {"status": "success", "results": results}
+    return results[0]
\ No newline at end of file
@@ -1,52 +1,237 @@
 import os
-import traceback
+import re
+import html
+import asyncio
+import logging
+import functools
+import concurrent.futures
 import tempfile
-import subprocess
+import posixpath
+import stat
+import shutil
 import base64
 import time
-import requests
+import random
 import hashlib
+import httpx
+import aiofiles
+import orjson
+import diskcache
+import pygit2
+from collections import OrderedDict
+
+try:
+    from blake3 import blake3 as content_hash
+except ImportError:  # SIMD BLAKE3 is optional; fall back to the stdlib
+    content_hash = functools.partial(hashlib.blake2b, digest_size=32)
 
 from fastapi import FastAPI, Request, HTTPException
-from github import Github, GithubException
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 load_dotenv()
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 try:
-    client = OpenAI(
+    client = AsyncOpenAI(
         api_key=os.getenv("AI_PIPE_TOKEN"),
-        base_url=os.getenv("AI_PIPE_URL")
+        base_url=os.getenv("AI_PIPE_URL"),
+        # Shared HTTP/2 pool so concurrent requests multiplex instead of queueing on the
+        # default limits; long read timeout for slow generations, short connect timeout
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=httpx.Timeout(120.0, connect=5.0),
+        )
     )
     MODEL_NAME = "google/gemini-2.0-flash-lite-001"
 except Exception as e:
     print(f"Error configuring AI Pipe client: {e}")
     client = None
 
+class LLMCache:
+    """LLM response cache: an in-process LRU in front of a persistent on-disk store."""
+
+    def __init__(self, directory, maxsize=256, ttl=86400):
+        self.memory = OrderedDict()  # key -> (value, expires_at), least recently used first
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk = diskcache.Cache(directory)
+
+    @staticmethod
+    def make_key(model, messages):
+        """Stable SHA-256 key over everything that determines the completion."""
+        blob = orjson.dumps({"m": model, "messages": messages}, option=orjson.OPT_SORT_KEYS)
+        return hashlib.sha256(blob).hexdigest()
+
+    async def get(self, key):
+        entry = self.memory.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.time():
+                self.memory.move_to_end(key)
+                return value
+            del self.memory[key]
+        # SQLite lookups stay off the event loop
+        value, expires_at = await asyncio.to_thread(self.disk.get, key, expire_time=True)
+        if value is not None:
+            self._remember(key, value, expires_at or time.time() + self.ttl)
+        return value
+
+    async def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        self._remember(key, value, time.time() + ttl)
+        await asyncio.to_thread(self.disk.set, key, value, expire=ttl)
+
+    def _remember(self, key, value, expires_at):
+        self.memory[key] = (value, expires_at)
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def close(self):
+        self.disk.close()
+
+# Survives restarts, so redeploys and retried briefs don't pay for the same completion twice
+llm_cache = LLMCache(os.getenv("LLM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "llm_cache")))
+
+# Literal values in a brief (quoted strings and numbers); briefs differing only in these
+# share a template cache entry. Quotes must stand apart from words, so apostrophes in
+# "the user's score" don't open a value.
+BRIEF_PARAM_RE = re.compile(
+    r"(?<!\w)'([^'\n]+)'(?!\w)|(?<!\w)\"([^\"\n]+)\"(?!\w)|(?<![\w.])(\d+(?:\.\d+)?)(?!\w|\.\d)"
+)
+# Numbers in briefs are templated but never substituted: they recur in CSS and JS
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+# Parts of a page that aren't visible text: comments, script/style bodies, and tags
+# (including their attributes)
+NON_TEXT_RE = re.compile(r"<!--.*?-->|<(script|style)\b.*?</\1\s*>|<[^>]*>", re.S | re.I)
+
+def brief_template(brief):
+    """Splits a brief into a template with {} placeholders and its literal parameters."""
+    params = []
+    def placeholder(match):
+        value = next(group for group in match.groups() if group is not None)
+        params.append(value)
+        return match.group(0).replace(value, "{}")
+    return BRIEF_PARAM_RE.sub(placeholder, brief), params
+
+def adapt_cached_code(entry, params):
+    """Rewrites code cached for a structurally identical brief to new parameters.
+
+    Only changed quoted strings are substituted, and only when each is distinctive (3+
+    characters, not a number) and occurs exactly once in the code, inside visible HTML
+    text. There the value is plain copy rather than an identifier, URL or CSS/JS literal,
+    and the new value is HTML-escaped. Returns None otherwise.
+    """
+    if len(entry["params"]) != len(params):
+        return None
+    mapping = {}
+    unchanged = set()
+    for old, new in zip(entry["params"], params):
+        if old == new:
+            unchanged.add(old)
+        elif mapping.setdefault(old, new) != new:
+            return None
+    code = entry["code"]
+    if not mapping:
+        return code
+    if unchanged & mapping.keys() or any(len(old) < 3 or NUMBER_RE.fullmatch(old) for old in mapping):
+        return None
+    hidden = [m.span() for m in NON_TEXT_RE.finditer(code)]
+    spans = []
+    for old, new in mapping.items():
+        # Text nodes hold the value HTML-escaped, so look for it in that form
+        pattern = re.compile(r"(?<![\w.])" + re.escape(html.escape(old, quote=False)) + r"(?!\w|\.\d)")
+        found = list(pattern.finditer(code))
+        if len(found) != 1:
+            return None
+        start, end = found[0].span()
+        if any(a < end and start < b for a, b in hidden):
+            return None
+        spans.append((start, end, html.escape(new, quote=False)))
+    spans.sort()
+    if any(prev[1] > cur[0] for prev, cur in zip(spans, spans[1:])):
+        return None
+    parts, pos = [], 0
+    for start, end, text in spans:
+        parts += [code[pos:start], text]
+        pos = end
+    parts.append(code[pos:])
+    return "".join(parts)
+
+# System prompts for the initial build and for round-2 updates
+SYSTEM_PROMPT_R1 = """You are an expert web developer. Create a complete, production-ready single HTML file.
+
+Requirements:
+- All HTML, CSS, and JavaScript in ONE file
+- Use Bootstrap 5 from CDN for styling
+- Include proper error handling
+- Make it functional and user-friendly
+- Use semantic HTML with accessibility attributes
+- Add comments explaining key functionality
+- Respond ONLY with raw HTML code (no markdown, no explanations)"""
+
+SYSTEM_PROMPT_R2 = """You are an expert web developer. Update the existing HTML file based on new requirements.
+
+Requirements:
+- Preserve existing functionality
+- Add the new features seamlessly
+- Maintain code quality and style
+- Keep all code in the single HTML file
+- Respond ONLY with the complete updated HTML code (no markdown, no explanations)"""
+
+# Shared client for outbound HTTP (evaluation callbacks, Pages probes); keep-alive
+# connections are reused across retries, probes and concurrent requests
+http = httpx.AsyncClient(
+    http2=True,
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+)
+
 ALLOWED = {"student@example.com": os.getenv("ALLOWED_SECRET_FOR_TESTING")}
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
-def handle_attachments(tmpdir, attachments):
-    """Save attachments to the temporary directory."""
-    attachment_files = []
-    for attach in attachments or []:
-        try:
-            path = os.path.join(tmpdir, attach["name"])
-            data_uri = attach["url"]
-            if "base64," in data_uri:
-                data = data_uri.split("base64,")[1]
-                with open(path, "wb") as f:
-                    f.write(base64.b64decode(data))
-                attachment_files.append(attach["name"])
-        except Exception as e:
-            print(f"Error handling attachment {attach.get('name')}: {e}")
-    return attachment_files
+# Persistent, pre-authenticated client for the GitHub REST API; HTTP/2 multiplexes
+# concurrent calls over one TLS connection
+gh_http = httpx.AsyncClient(
+    base_url="https://api.github.com",
+    headers={
+        "Authorization": f"token {GITHUB_TOKEN}",
+        "Accept": "application/vnd.github.v3+json",
+        # Bodies are pre-serialised with orjson and sent as raw content
+        "Content-Type": "application/json"
+    },
+    http2=True,
+    timeout=15.0
+)
 
-def generate_readme_content(task, brief, checks=None, attachment_files=None):
-    """Generates comprehensive README.md content."""
-    readme = f"""# {task}
+# The token never changes, so the authenticated user is resolved once per process.
+# PyGithub is imported on first use to keep it out of cold-start import time.
+@functools.cache
+def github_user():
+    """Returns the authenticated PyGithub user with its login already fetched."""
+    from github import Auth, Github
+    # Concurrent requests share this client, so size its session pool for them
+    gh = Github(auth=Auth.Token(GITHUB_TOKEN), per_page=100, pool_size=20)
+    user = gh.get_user()
+    print(f"Authenticated to GitHub as {user.login}")
+    return user
+
+GIT_AUTHOR = {"name": "LLM Deployment Bot", "email": "bot@example.com"}
+# Handed to libgit2 in memory on push; the token never lands in a remote URL or .git/config
+GIT_CREDENTIALS = pygit2.UserPass("x-access-token", GITHUB_TOKEN or "")
+
+# Blocking git and PyGithub work gets its own pool so slow pushes can't starve the
+# default executor that file I/O and the disk cache share
+GIT_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="git")
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking call (pygit2 or PyGithub) on the git pool."""
+    return await asyncio.get_running_loop().run_in_executor(GIT_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+README_TEMPLATE = """# {task}
 
 ## Summary
 This project was automatically generated to fulfill the following requirement:
@@ -66,17 +251,7 @@ This project was automatically generated to fulfill the following requirement:
 - The application will automatically load and execute according to the brief requirements
 """
 
-    if attachment_files:
-        readme += f"\n## Included Files\n"
-        for fname in attachment_files:
-            readme += f"- `{fname}`\n"
-
-    if checks:
-        readme += f"\n## Evaluation Criteria\nThis application is evaluated against the following checks:\n"
-        for check in checks:
-            readme += f"- {check}\n"
-
-    readme += f"""
+README_FOOTER = """
 ## Code Explanation
 The application is built as a single-page HTML file (`index.html`) that includes:
 - **HTML Structure**: Semantic markup with proper accessibility attributes
@@ -89,13 +264,10 @@ The code was generated using AI assistance based on the project brief and automa
 ## License
 MIT License - See LICENSE file for details
 """
-    return readme
 
-def generate_license_content(github_user_login):
-    """Generates MIT LICENSE content."""
-    return f"""MIT License
+LICENSE_TEMPLATE = """MIT License
 
-Copyright (c) 2025 {github_user_login}
+Copyright (c) 2025 {login}
 
 Permission is hereby granted, free of charge, to any person obtaining a copy
 of this software and associated documentation files (the "Software"), to deal
@@ -116,96 +288,437 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-def generate_code_with_llm(brief, attachments, round_num, existing_code=None):
-    """Generates or modifies code using the AI Pipe."""
+def init_and_stage(path, files):
+    """Creates a repository on main at path and stages the given files; returns it."""
+    repo = pygit2.init_repository(path, initial_head="main")
+    for name in files:
+        repo.index.add(name)
+    return repo
+
+def commit_and_push(repo, full_repo_name, message, files=()):
+    """Stages any remaining files, commits, and pushes main to GitHub; returns the SHA."""
+    for name in files:
+        repo.index.add(name)
+    repo.index.write()
+    tree = repo.index.write_tree()
+    signature = pygit2.Signature(GIT_AUTHOR["name"], GIT_AUTHOR["email"])
+    oid = repo.create_commit("refs/heads/main", signature, signature, message, tree, [])
+    remote = repo.remotes.create("origin", f"https://github.com/{full_repo_name}.git")
+    remote.push(["refs/heads/main"], callbacks=pygit2.RemoteCallbacks(credentials=GIT_CREDENTIALS))
+    return str(oid)
+
+def repo_name_taken(error):
+    """True if a 422 from create_repo means the name is already in use on the account."""
+    if not isinstance(error.data, dict):
+        return False
+    errors = error.data.get("errors") or []
+    return any(isinstance(err, dict) and "already exists" in (err.get("message") or "") for err in errors)
+
+async def discard_new_repo(repo_task, full_repo_name):
+    """Best-effort removal of a repository created for a request that then failed."""
+    try:
+        gh_repo = await repo_task
+    except Exception:
+        return  # nothing was created
+    try:
+        await run_blocking(gh_repo.delete)
+    except Exception as e:
+        print(f"⚠ Could not delete {full_repo_name}: {e}")
+
+async def write_file(path, data, mode="wb"):
+    """Writes bytes to disk without blocking the event loop."""
+    async with aiofiles.open(path, mode) as f:
+        await f.write(data)
+
+def attachment_relpath(name):
+    """Normalises an attachment name to a relative path, rejecting absolute or escaping names."""
+    rel = posixpath.normpath(name.replace("\\", "/"))
+    if not name or rel.startswith("/") or rel in (".", "..") or rel.startswith("../"):
+        raise ValueError(f"Unsafe attachment name: {name!r}")
+    return rel
+
+def decode_attachments(attachments):
+    """Decode base64 data URI attachments into a {name: bytes} mapping."""
+    decoded = {}
+    for attach in attachments or []:
+        try:
+            name = attachment_relpath(attach["name"])
+            _, sep, data = attach["url"].partition("base64,")
+            if sep:
+                decoded[name] = base64.b64decode(data)
+        except Exception as e:
+            print(f"Error handling attachment {attach.get('name')}: {e}")
+    return decoded
+
+# Base64 slice size for streamed decoding; a multiple of 4 so slices decode independently
+B64_CHUNK = 64 * 1024
+
+# Decoded attachments keyed by a hash of their payload, shared across requests
+ATTACHMENT_CACHE_DIR = os.getenv("ATTACHMENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "attachment_cache"))
+
+def ensure_private_dir(path):
+    """Creates path as a 0700 directory; refuses one another user could have planted files in."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f"{path} must be a directory owned by this user with mode 0700")
+
+# Cached files are linked into published repos, so nobody else may write here
+ensure_private_dir(ATTACHMENT_CACHE_DIR)
+# Entries unused for this long are dropped; hits refresh the clock
+ATTACHMENT_CACHE_TTL = int(os.getenv("ATTACHMENT_CACHE_TTL", 7 * 86400))
+_attachment_cache_pruned = 0.0
+# Written by the server itself; attachments with these names would be overwritten anyway
+GENERATED_FILES = {"index.html", "README.md", "LICENSE"}
+
+def prune_attachment_cache(interval=3600):
+    """Removes cached attachments unused for ATTACHMENT_CACHE_TTL; scans at most once per interval."""
+    global _attachment_cache_pruned
+    now = time.time()
+    if now - _attachment_cache_pruned < interval:
+        return
+    _attachment_cache_pruned = now
+    for entry in os.scandir(ATTACHMENT_CACHE_DIR):
+        try:
+            if entry.stat().st_mtime < now - ATTACHMENT_CACHE_TTL:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+def cache_attachment(data):
+    """Decodes a base64 payload into the attachment cache once; returns the cached path."""
+    cached = os.path.join(ATTACHMENT_CACHE_DIR, content_hash(data.encode("ascii")).hexdigest())
+    try:
+        os.utime(cached)  # mark as recently used so pruning keeps it
+        return cached
+    except FileNotFoundError:
+        pass
+    # Decode slice by slice so peak memory stays near the encoded size
+    fd, tmp_path = tempfile.mkstemp(dir=ATTACHMENT_CACHE_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for i in range(0, len(data), B64_CHUNK):
+                f.write(base64.b64decode(data[i:i + B64_CHUNK]))
+        os.replace(tmp_path, cached)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return cached
+
+def handle_attachments(tmpdir, attachments):
+    """Save attachments to the temporary directory."""
+    prune_attachment_cache()
+    attachment_files = []
+    for attach in attachments or []:
+        try:
+            name = attachment_relpath(attach["name"])
+            _, sep, data = attach["url"].partition("base64,")
+            if not sep:
+                continue
+            if name in GENERATED_FILES:
+                # index.html may already be streaming in; the generated file wins
+                print(f"Skipping attachment {name}: name is reserved for a generated file")
+                continue
+            if any(c in data for c in " \r\n\t"):
+                # Whitespace would break the 4-character alignment of the slices
+                data = "".join(data.split())
+            cached = cache_attachment(data)
+            path = os.path.join(tmpdir, name)
+            # A duplicate name may already be a link to another cache entry; writing
+            # through it would overwrite that entry, so replace the path instead
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            try:
+                os.link(cached, path)
+            except OSError:  # e.g. the temp dir is on another device
+                shutil.copyfile(cached, path)
+            attachment_files.append(name)
+        except Exception as e:
+            print(f"Error handling attachment {attach.get('name')}: {e}")
+    return attachment_files
+
+def generate_readme_content(task, brief, checks=None, attachment_files=None):
+    """Generates comprehensive README.md content."""
+    parts = [README_TEMPLATE.format_map({"task": task, "brief": brief})]
+
+    if attachment_files:
+        parts.append("\n## Included Files\n")
+        parts.extend(f"- `{fname}`\n" for fname in attachment_files)
+
+    if checks:
+        parts.append("\n## Evaluation Criteria\nThis application is evaluated against the following checks:\n")
+        parts.extend(f"- {check}\n" for check in checks)
+
+    parts.append(README_FOOTER)
+    return "".join(parts)
+
+def generate_license_content(github_user_login):
+    """Generates MIT LICENSE content."""
+    return LICENSE_TEMPLATE.format_map({"login": github_user_login})
+
+def strip_fences(text):
+    """Returns the code inside a markdown fence, dropping any prose around it.
+
+    Takes the text between the first opening fence and the last closing fence; a single
+    fence is treated as opening if code follows it, otherwise as closing.
+    """
+    start = text.find("```")
+    if start == -1:
+        return text.strip()
+    body = start + 3
+    if text[body:body + 4].lower() == "html":
+        body += 4
+    end = text.rfind("```", body)
+    if end != -1:
+        return text[body:end].strip()
+    if not text[:start].strip() or text[body:].lstrip().startswith("<"):
+        return text[body:].strip()
+    return text[:start].strip()
+
+async def generate_code_with_llm(brief, attachments, round_num, existing_code=None, out_path=None):
+    """Generates or modifies code using the AI Pipe, streaming it to out_path if given."""
     if not client:
         raise HTTPException(status_code=500, detail="AI Pipe client not configured.")
     
     # Build context about attachments
     attachment_context = ""
     if attachments:
-        attachment_context = "\n\nAvailable files:\n"
-        for attach in attachments:
-            attachment_context += f"- {attach['name']}\n"
+        attachment_context = "\n\nAvailable files:\n" + "".join(f"- {attach['name']}\n" for attach in attachments)
     
+    template_key = None
     if round_num == 1:
-        system_prompt = """You are an expert web developer. Create a complete, production-ready single HTML file.
-
-Requirements:
-- All HTML, CSS, and JavaScript in ONE file
-- Use Bootstrap 5 from CDN for styling
-- Include proper error handling
-- Make it functional and user-friendly
-- Use semantic HTML with accessibility attributes
-- Add comments explaining key functionality
-- Respond ONLY with raw HTML code (no markdown, no explanations)"""
-        
-        user_prompt = f'BRIEF: {brief}{attachment_context}\n\nCreate a complete HTML file that fulfills this brief.'
+        template, params = brief_template(brief)
+        if params:
+            template_key = LLMCache.make_key(f"{MODEL_NAME}:template", [SYSTEM_PROMPT_R1, template + attachment_context])
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT_R1},
+            {"role": "user", "content": f'BRIEF: {brief}{attachment_context}\n\nCreate a complete HTML file that fulfills this brief.'}
+        ]
     else:
-        system_prompt = """You are an expert web developer. Update the existing HTML file based on new requirements.
-
-Requirements:
-- Preserve existing functionality
-- Add the new features seamlessly
-- Maintain code quality and style
-- Keep all code in the single HTML file
-- Respond ONLY with the complete updated HTML code (no markdown, no explanations)"""
-        
-        user_prompt = f'BRIEF: {brief}{attachment_context}\n\nEXISTING CODE:\n{existing_code}\n\nUpdate this code to meet the new requirements.'
+        # The large existing code goes first and the small brief last, so the provider can
+        # reuse its prompt cache for the shared prefix across calls on the same repo
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT_R2},
+            {"role": "user", "content": f'EXISTING CODE:\n{existing_code}'},
+            {"role": "user", "content": f'UPDATE BRIEF: {brief}{attachment_context}\n\nUpdate the existing code to meet the new requirements.'}
+        ]
+    
+    # Retries and re-submissions of the same brief skip the LLM round-trip entirely
+    cache_key = LLMCache.make_key(MODEL_NAME, messages)
+    cached = await llm_cache.get(cache_key)
+    if cached is None and template_key:
+        # Near-duplicate brief: reuse the code generated for the same template if the
+        # changed values can be substituted safely, otherwise fall through to the LLM
+        entry = await llm_cache.get(template_key)
+        cached = adapt_cached_code(entry, params) if entry else None
+    if cached is not None:
+        print("✓ LLM cache hit")
+        if out_path:
+            await write_file(out_path, cached.encode("utf-8"))
+        return cached
     
     try:
-        completion = client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+            messages=messages,
+            stream=True
         )
-        clean_code = completion.choices[0].message.content.strip()
+        # Write tokens as they arrive so the file is ready as soon as the stream ends
+        parts = []
+        out = await aiofiles.open(out_path, "w", encoding="utf-8") if out_path else None
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    if out:
+                        await out.write(delta)
+        finally:
+            if out:
+                await out.close()
+        raw_code = "".join(parts)
         # Remove markdown code blocks if present
-        clean_code = clean_code.replace("```html", "").replace("```", "").strip()
+        clean_code = strip_fences(raw_code)
+        if out_path and clean_code != raw_code:
+            await write_file(out_path, clean_code.encode("utf-8"))
+        await llm_cache.set(cache_key, clean_code)
+        if template_key:
+            await llm_cache.set(template_key, {"params": params, "code": clean_code})
         return clean_code
     except Exception as e:
         print(f"AI Pipe call failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate code: {str(e)}")
 
-def verify_pages_active(pages_url, max_attempts=30, delay=10):
+async def verify_pages_active(pages_url, timeout=100, delay=2, max_delay=20):
     """Verify that GitHub Pages is active and returning 200 OK."""
     print(f"Verifying Pages URL: {pages_url}")
-    for attempt in range(max_attempts):
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        attempt += 1
         try:
-            response = requests.get(pages_url, timeout=10)
+            # HEAD is enough to read the status without downloading the page
+            response = await http.head(pages_url, follow_redirects=True, timeout=5)
             if response.status_code == 200:
-                print(f"✓ Pages active after {attempt + 1} attempts")
+                print(f"✓ Pages active after {attempt} attempts")
                 return True
-        except requests.RequestException as e:
-            print(f"Attempt {attempt + 1}: Pages not ready yet ({e})")
-        time.sleep(delay)
-    return False
+        except httpx.RequestError as e:
+            print(f"Attempt {attempt}: Pages not ready yet ({e})")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        # Probe early while a fresh deployment is likely to land, then back off
+        await asyncio.sleep(min(delay + random.uniform(0, 1), remaining))
+        delay = min(max_delay, delay * 1.5)
+
+def rate_limit_delay(response):
+    """Returns the seconds a throttling response asks us to wait, or None."""
+    if response.status_code not in (403, 429, 503):
+        return None
+    retry_after = response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return int(retry_after)
+    reset = response.headers.get("X-RateLimit-Reset")
+    if response.headers.get("X-RateLimit-Remaining") == "0" and reset and reset.isdigit():
+        return max(0, int(reset) - time.time())
+    return None
 
-def post_with_retry(url, payload, max_attempts=5):
-    """Posts data with exponential backoff retry logic."""
-    delay = 1
+async def post_with_retry(url, payload, max_attempts=5, idempotency_key=None, max_delay=60):
+    """Posts data with jittered exponential backoff retry logic."""
+    headers = {"Content-Type": "application/json"}
+    # Lets the receiver drop duplicates if an earlier attempt landed but its response was lost
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
+    body = orjson.dumps(payload)
     for attempt in range(max_attempts):
+        wait = None
         try:
-            r = requests.post(url, json=payload, timeout=10)
+            r = await http.post(url, content=body, headers=headers)
             if r.status_code == 200:
                 print(f"✓ Successfully posted to evaluation URL (attempt {attempt + 1})")
                 return True
             else:
                 print(f"Evaluation URL returned {r.status_code}: {r.text}")
-        except requests.RequestException as e:
+                wait = rate_limit_delay(r)
+        except httpx.RequestError as e:
             print(f"Attempt {attempt + 1} failed: {e}")
         
         if attempt < max_attempts - 1:
-            time.sleep(delay)
-            delay *= 2
+            if wait is None:
+                # Jitter keeps concurrent retries from landing in the same window
+                wait = min(max_delay, 2 ** attempt) * random.uniform(0.5, 1.5)
+            await asyncio.sleep(min(wait, max_delay))
     return False
 
+async def enable_pages(full_repo_name, max_attempts=3, max_delay=60):
+    """Enables GitHub Pages on the main branch, waiting out API rate limits."""
+    for attempt in range(max_attempts):
+        response = await gh_http.post(
+            f"/repos/{full_repo_name}/pages",
+            content=orjson.dumps({"source": {"branch": "main", "path": "/"}})
+        )
+        wait = rate_limit_delay(response)
+        if wait is None or attempt == max_attempts - 1:
+            return response
+        print(f"GitHub rate limit hit, retrying Pages enablement in {wait:.0f}s")
+        await asyncio.sleep(min(wait, max_delay))
+
+# Branch head plus the files round 2 builds on, in a single round trip
+REPO_STATE_QUERY = """
+query($owner: String!, $name: String!, $ref: String!, $html: String!, $readme: String!) {
+  repository(owner: $owner, name: $name) {
+    ref(qualifiedName: $ref) { target { ... on Commit { oid tree { oid } } } }
+    html: object(expression: $html) { ...BlobText }
+    readme: object(expression: $readme) { ...BlobText }
+  }
+}
+
+fragment BlobText on Blob {
+  oid
+  text
+  isBinary
+  isTruncated
+}
+"""
+
+async def read_repo_state(full_repo_name, branch="main"):
+    """Returns (head, index.html, README.md) via GraphQL; head is None if the repo or branch is missing."""
+    owner, name = full_repo_name.split("/", 1)
+    variables = {
+        "owner": owner,
+        "name": name,
+        "ref": f"refs/heads/{branch}",
+        "html": f"{branch}:index.html",
+        "readme": f"{branch}:README.md",
+    }
+    r = await gh_http.post("/graphql", content=orjson.dumps({"query": REPO_STATE_QUERY, "variables": variables}))
+    r.raise_for_status()
+    body = orjson.loads(r.content)
+    repo = (body.get("data") or {}).get("repository")
+    if repo is None:
+        errors = body.get("errors") or []
+        if any(e.get("type") != "NOT_FOUND" for e in errors):
+            raise RuntimeError(f"GitHub GraphQL error: {errors}")
+        return None, None, None
+    head = (repo["ref"] or {}).get("target")
+    page, readme = await asyncio.gather(
+        read_blob_text(full_repo_name, repo["html"]),
+        read_blob_text(full_repo_name, repo["readme"]),
+    )
+    return head, page, readme
+
+async def read_blob_text(full_repo_name, blob):
+    """Returns a GraphQL blob's full text, or None if the file is missing.
+
+    GraphQL leaves text null for non-UTF-8 blobs and may truncate large ones, so those
+    are fetched through the Git Data API; content that still isn't UTF-8 raises.
+    """
+    if not blob:
+        return None
+    if blob["text"] is not None and not blob["isTruncated"] and not blob["isBinary"]:
+        return blob["text"]
+    r = await gh_http.get(f"/repos/{full_repo_name}/git/blobs/{blob['oid']}")
+    r.raise_for_status()
+    return base64.b64decode(orjson.loads(r.content)["content"]).decode("utf-8")
+
+async def commit_files(full_repo_name, head, files, message, branch="main"):
+    """Commits {path: str | bytes} on top of head via the Git Data API; returns the new SHA."""
+    tree = []
+    for path, data in files.items():
+        if isinstance(data, str):
+            # Text can be inlined in the tree; binary content needs its own blob
+            tree.append({"path": path, "mode": "100644", "type": "blob", "content": data})
+            continue
+        blob = await gh_http.post(
+            f"/repos/{full_repo_name}/git/blobs",
+            content=orjson.dumps({"content": base64.b64encode(data).decode("ascii"), "encoding": "base64"})
+        )
+        blob.raise_for_status()
+        tree.append({"path": path, "mode": "100644", "type": "blob", "sha": orjson.loads(blob.content)["sha"]})
+    
+    r = await gh_http.post(
+        f"/repos/{full_repo_name}/git/trees",
+        content=orjson.dumps({"base_tree": head["tree"]["oid"], "tree": tree})
+    )
+    r.raise_for_status()
+    tree_sha = orjson.loads(r.content)["sha"]
+    r = await gh_http.post(
+        f"/repos/{full_repo_name}/git/commits",
+        content=orjson.dumps({"message": message, "tree": tree_sha, "parents": [head["oid"]], "author": GIT_AUTHOR})
+    )
+    r.raise_for_status()
+    commit_sha = orjson.loads(r.content)["sha"]
+    
+    r = await gh_http.patch(f"/repos/{full_repo_name}/git/refs/heads/{branch}", content=orjson.dumps({"sha": commit_sha}))
+    r.raise_for_status()
+    return commit_sha
+
 @app.post("/api-endpoint")
 async def handle_request(request: Request):
     start_time = time.time()
-    data = await request.json()
+    data = orjson.loads(await request.body())
     
     with tempfile.TemporaryDirectory() as tmpdir:
         try:
@@ -224,82 +737,95 @@ async def handle_request(request: Request):
             attachments = data.get("attachments", [])
             checks = data.get("checks", [])
             
-            gh = Github(GITHUB_TOKEN)
-            user = gh.get_user()
+            user = await run_blocking(github_user)
             
             if round_num == 1:
                 # Round 1: Create new repository
                 repo_name = f"{task}-{nonce}".replace(" ", "-").lower()
                 full_repo_name = f"{user.login}/{repo_name}"
                 
-                # Check if repo already exists
-                try:
-                    gh.get_repo(full_repo_name)
-                    raise HTTPException(status_code=409, detail=f"Repository '{full_repo_name}' already exists")
-                except GithubException as e:
-                    if e.status != 404:
-                        raise e
-                
-                # Handle attachments
-                attachment_files = handle_attachments(tmpdir, attachments)
-                
-                # Generate code
-                html_content = generate_code_with_llm(brief, attachments, round_num)
-                
-                # Generate files
-                readme_content = generate_readme_content(task, brief, checks, attachment_files)
-                license_content = generate_license_content(user.login)
-                
-                # Write files
-                with open(os.path.join(tmpdir, "index.html"), "w", encoding="utf-8") as f:
-                    f.write(html_content)
-                with open(os.path.join(tmpdir, "README.md"), "w", encoding="utf-8") as f:
-                    f.write(readme_content)
-                with open(os.path.join(tmpdir, "LICENSE"), "w", encoding="utf-8") as f:
-                    f.write(license_content)
-                
-                # Create repository
+                # Start the two slow network calls first: the repository is created while
+                # code streams into index.html, and the local files are prepared meanwhile.
+                # create_repo doubles as the existence check: a taken name fails with 422.
+                from github import GithubException
                 print(f"Creating repository: {full_repo_name}")
-                repo = user.create_repo(repo_name, private=False)
+                repo_task = asyncio.create_task(run_blocking(user.create_repo, repo_name, private=False))
+                html_task = asyncio.create_task(
+                    generate_code_with_llm(brief, attachments, round_num, out_path=os.path.join(tmpdir, "index.html"))
+                )
                 
-                # Git operations
-                subprocess.run(["git", "init"], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "config", "user.email", "bot@example.com"], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "config", "user.name", "LLM Deployment Bot"], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "add", "."], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "commit", "-m", "Initial commit"], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "branch", "-M", "main"], cwd=tmpdir, check=True, capture_output=True)
+                try:
+                    # Handle attachments (base64 decoding and file writes stay off the event loop)
+                    attachment_files = await asyncio.to_thread(handle_attachments, tmpdir, attachments)
+                    
+                    # Generate files
+                    readme_content = generate_readme_content(task, brief, checks, attachment_files)
+                    license_content = generate_license_content(user.login)
+                    
+                    await asyncio.gather(
+                        write_file(os.path.join(tmpdir, "README.md"), readme_content.encode("utf-8")),
+                        write_file(os.path.join(tmpdir, "LICENSE"), license_content.encode("utf-8")),
+                    )
+                    
+                    # Stage everything except index.html while the LLM is still streaming
+                    git_repo = await run_blocking(
+                        init_and_stage, tmpdir, ["README.md", "LICENSE", *attachment_files]
+                    )
+                except Exception:
+                    # Stop streaming into a temp dir that is about to go away, and drop the repo
+                    html_task.cancel()
+                    await asyncio.gather(html_task, return_exceptions=True)
+                    await discard_new_repo(repo_task, full_repo_name)
+                    raise
                 
-                remote_url = f"https://{GITHUB_TOKEN}@github.com/{full_repo_name}.git"
-                subprocess.run(["git", "remote", "add", "origin", remote_url], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "push", "-u", "origin", "main"], cwd=tmpdir, check=True, capture_output=True)
+                try:
+                    await repo_task
+                except Exception as e:
+                    html_task.cancel()
+                    await asyncio.gather(html_task, return_exceptions=True)
+                    if isinstance(e, GithubException) and e.status == 422:
+                        # 422 also covers validation failures such as an invalid repo name
+                        if repo_name_taken(e):
+                            raise HTTPException(status_code=409, detail=f"Repository '{full_repo_name}' already exists")
+                        raise HTTPException(status_code=422, detail=f"Repository creation failed: {e.data}")
+                    raise e
+                try:
+                    await html_task
+                except Exception:
+                    # An empty repo left behind would turn every retry of this task into a 409
+                    await discard_new_repo(repo_task, full_repo_name)
+                    raise
                 
-                # Enable GitHub Pages
-                print("Enabling GitHub Pages...")
-                pages_api_url = f"https://api.github.com/repos/{full_repo_name}/pages"
-                headers = {
-                    "Authorization": f"token {GITHUB_TOKEN}",
-                    "Accept": "application/vnd.github.v3+json"
-                }
-                pages_response = requests.post(
-                    pages_api_url,
-                    headers=headers,
-                    json={"source": {"branch": "main", "path": "/"}}
+                # Push in-process through libgit2 while GitHub Pages is enabled alongside
+                print("Pushing and enabling GitHub Pages...")
+                # return_exceptions lets the Pages call settle before a failed push is handled
+                commit_sha, pages_response = await asyncio.gather(
+                    run_blocking(commit_and_push, git_repo, full_repo_name, "Initial commit", ["index.html"]),
+                    enable_pages(full_repo_name),
+                    return_exceptions=True,
                 )
+                if isinstance(commit_sha, BaseException):
+                    # Nothing landed, so the empty repo would block every retry with a 409
+                    await discard_new_repo(repo_task, full_repo_name)
+                    raise commit_sha
+                if isinstance(pages_response, BaseException):
+                    raise pages_response
+                if pages_response.status_code == 422:
+                    # Pages rejects a repo whose branch hasn't landed yet; ask again now that it has
+                    pages_response = await enable_pages(full_repo_name)
                 
                 if pages_response.status_code in [201, 409]:
                     print("✓ GitHub Pages enabled")
                 else:
                     print(f"⚠ Pages enablement status: {pages_response.status_code}")
                 
-                commit_sha = repo.get_branch("main").commit.sha
-                final_repo_url = repo.html_url
+                final_repo_url = f"https://github.com/{full_repo_name}"
                 pages_url = f"https://{user.login}.github.io/{repo_name}/"
                 
                 # Verify Pages is active (with timeout consideration)
                 elapsed = time.time() - start_time
                 if elapsed < 540:  # Leave 60 seconds for evaluation post
-                    verify_pages_active(pages_url, max_attempts=20, delay=5)
+                    await verify_pages_active(pages_url, timeout=min(100, 540 - elapsed))
                 
             else:
                 # Round 2: Update existing repository
@@ -311,51 +837,31 @@ async def handle_request(request: Request):
                 repo_name = prev_repo_url.rstrip('/').split('/')[-1]
                 full_repo_name = f"{user.login}/{repo_name}"
                 
-                # Verify repo exists
-                try:
-                    repo = gh.get_repo(full_repo_name)
-                except GithubException:
+                # Fetch the branch head (also the parent for the update) and read the current
+                # page and README straight from GitHub in one query; no clone needed
+                head, existing_html, readme = await read_repo_state(full_repo_name)
+                if not head:
                     raise HTTPException(status_code=404, detail=f"Repository {full_repo_name} not found")
-                
-                # Clone existing repo
-                print(f"Cloning repository: {full_repo_name}")
-                clone_url = f"https://{GITHUB_TOKEN}@github.com/{full_repo_name}.git"
-                subprocess.run(["git", "clone", clone_url, tmpdir], check=True, capture_output=True)
-                
-                # Handle new attachments
-                attachment_files = handle_attachments(tmpdir, attachments)
-                
-                # Read existing code
-                try:
-                    with open(os.path.join(tmpdir, "index.html"), "r", encoding="utf-8") as f:
-                        existing_html = f.read()
-                except FileNotFoundError:
-                    existing_html = ""
+                existing_html = existing_html or ""
+                readme = readme or ""
                 
                 # Generate updated code
-                new_html_content = generate_code_with_llm(brief, attachments, round_num, existing_code=existing_html)
+                new_html_content = await generate_code_with_llm(brief, attachments, round_num, existing_code=existing_html)
                 
-                # Update files
-                with open(os.path.join(tmpdir, "index.html"), "w", encoding="utf-8") as f:
-                    f.write(new_html_content)
+                # Round summary appended to README
+                readme_parts = [readme, f"\n\n---\n\n## Round {round_num} Update\n\n**Brief**: {brief}\n\n"]
+                if checks:
+                    readme_parts.append("**New Evaluation Criteria**:\n")
+                    readme_parts.extend(f"- {check}\n" for check in checks)
                 
-                # Append to README
-                with open(os.path.join(tmpdir, "README.md"), "a", encoding="utf-8") as f:
-                    f.write(f"\n\n---\n\n## Round {round_num} Update\n\n**Brief**: {brief}\n\n")
-                    if checks:
-                        f.write("**New Evaluation Criteria**:\n")
-                        for check in checks:
-                            f.write(f"- {check}\n")
-                
-                # Git operations
-                subprocess.run(["git", "config", "user.email", "bot@example.com"], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "config", "user.name", "LLM Deployment Bot"], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "add", "."], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "commit", "-m", f"Round {round_num} update"], cwd=tmpdir, check=True, capture_output=True)
-                subprocess.run(["git", "push"], cwd=tmpdir, check=True, capture_output=True)
-                
-                commit_sha = repo.get_branch("main").commit.sha
-                final_repo_url = repo.html_url
+                # Push new attachments and updated files as a single commit
+                files = {
+                    **await asyncio.to_thread(decode_attachments, attachments),
+                    "index.html": new_html_content,
+                    "README.md": "".join(readme_parts),
+                }
+                commit_sha = await commit_files(full_repo_name, head, files, f"Round {round_num} update")
+                final_repo_url = f"https://github.com/{full_repo_name}"
                 pages_url = f"https://{user.login}.github.io/{repo_name}/"
             
             # Check 10-minute constraint
@@ -374,7 +880,7 @@ async def handle_request(request: Request):
                 "pages_url": pages_url
             }
             
-            success = post_with_retry(evaluation_url, payload)
+            success = await post_with_retry(evaluation_url, payload, idempotency_key=f"{nonce}-{round_num}")
             if not success:
                 raise HTTPException(status_code=500, detail="Failed to notify evaluation URL")
             
@@ -387,11 +893,21 @@ async def handle_request(request: Request):
             }
         
         except Exception as e:
-            traceback.print_exc()
+            logging.exception("Request failed")
             if isinstance(e, HTTPException):
                 raise e
             raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+@app.on_event("shutdown")
+async def close_clients():
+    """Release pooled connections on shutdown."""
+    await http.aclose()
+    await gh_http.aclose()
+    if client:
+        await client.close()
+    llm_cache.close()
+    GIT_EXECUTOR.shutdown(wait=False)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring."""
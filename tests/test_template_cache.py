@@ -0,0 +1,52 @@
+from server import adapt_cached_code, brief_template
+
+
+def entry_for(brief, code):
+    return {"params": brief_template(brief)[1], "code": code}
+
+
+def test_apostrophes_are_not_quotes():
+    template, params = brief_template("Show the user's score and the player's name")
+    assert params == []
+    assert template == "Show the user's score and the player's name"
+
+
+def test_quoted_values_and_numbers_are_templated():
+    template, params = brief_template("Page titled 'Sales Report' listing 100 rows")
+    assert template == "Page titled '{}' listing {} rows"
+    assert params == ["Sales Report", "100"]
+
+
+def test_text_node_value_is_substituted_and_escaped():
+    entry = entry_for("Page titled 'Sales Report'", "<h1>Sales Report</h1>")
+    _, params = brief_template("Page titled 'Tom & Jerry <3'")
+    assert adapt_cached_code(entry, params) == "<h1>Tom &amp; Jerry &lt;3</h1>"
+
+
+def test_value_inside_script_is_not_substituted():
+    entry = entry_for("Page titled 'Sales Report'", '<script>const t = "Sales Report";</script>')
+    _, params = brief_template("""Page titled 'He said "hi" </script>'""")
+    assert adapt_cached_code(entry, params) is None
+
+
+def test_value_in_attribute_or_comment_is_not_substituted():
+    _, params = brief_template("Use 'chart.js' for plots")
+    for code in ['<script src="chart.js"></script>', "<!-- uses chart.js -->"]:
+        assert adapt_cached_code(entry_for("Use 'moment.js' for plots", code), params) is None
+
+
+def test_value_also_used_in_code_is_not_substituted():
+    code = '<h1>Sales Report</h1><script>document.title = "Sales Report";</script>'
+    _, params = brief_template("Page titled 'Team Roster'")
+    assert adapt_cached_code(entry_for("Page titled 'Sales Report'", code), params) is None
+
+
+def test_changed_numbers_are_not_substituted():
+    code = '<div style="width: 100%">100</div>'
+    _, params = brief_template("Counter starts at 250")
+    assert adapt_cached_code(entry_for("Counter starts at 100", code), params) is None
+
+
+def test_identical_params_return_cached_code():
+    entry = entry_for("Counter starts at 100", "<p>100</p>")
+    assert adapt_cached_code(entry, ["100"]) == "<p>100</p>"